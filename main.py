@@ -12,9 +12,13 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
+from limits import parse as parse_rate_limit
 import os
 import bleach
 import re
+import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime
 import gspread
 from google.oauth2.service_account import Credentials
@@ -58,6 +62,102 @@ def sanitize_email(email: str) -> str:
         return email[:100]
     return ""
 
+def sanitize_token(token: str) -> str:
+    """Sanitize submission token - only letters, digits and hyphens"""
+    if not token:
+        return ""
+    
+    return re.sub(r'[^A-Za-z0-9\-]', '', token.strip())[:64]
+
+def normalize_phone(phone: str) -> str:
+    """Normalize phone for duplicate detection - last 9 digits (drops +351/00351)"""
+    return re.sub(r'\D', '', phone or "")[-9:]
+
+def submission_key(phone: str, name: str) -> str:
+    """Duplicate-detection key: normalized phone + name (same phone may register several people)"""
+    phone_key = normalize_phone(phone)
+    if not phone_key:
+        return ""
+    return f"{phone_key}:{' '.join(name.lower().split())}"
+
+# Idempotency: evitar escritas duplicadas (duplo clique / refresh do POST)
+# ATENÇÃO: os índices abaixo vivem na memória do processo. A deteção de duplicados
+# assume um único worker uvicorn (configuração atual do Procfile e render.yaml) e um
+# restart reinicia a janela. Com vários workers (--workers N) cada um tem os seus
+# índices e a garantia perde-se - mover os índices para um armazenamento partilhado.
+DUPLICATE_WINDOW_SECONDS = 10 * 60
+
+# Índices em memória, por ordem de inserção: chave -> (created_at, registration)
+submission_tokens = OrderedDict()   # (form_type, token) -> ...
+submission_keys = OrderedDict()     # (form_type, phone + name) -> ...
+
+# Limites das submissões, aplicados depois da deteção de duplicados (replays não contam)
+PREREGISTER_RATE_LIMIT = parse_rate_limit("5/minute")
+REGISTER_RATE_LIMIT = parse_rate_limit("3/minute")
+
+def new_submission_token() -> str:
+    """Token único embutido nos formulários (campo submission_token)"""
+    return uuid.uuid4().hex
+
+def generate_submission_id(prefix: str) -> str:
+    """ID de submissão sem colisões, mesmo com pedidos no mesmo segundo"""
+    return f"{prefix}{datetime.now().strftime('%Y%m%d%H%M%S')}{uuid.uuid4().hex[:6].upper()}"
+
+def _prune_submissions(index: OrderedDict, now: float):
+    """Remover entradas fora da janela (as mais antigas estão no início)"""
+    while index:
+        created_at, _ = next(iter(index.values()))
+        if now - created_at <= DUPLICATE_WINDOW_SECONDS:
+            break
+        index.popitem(last=False)
+
+def _same_submission_fields(stored: dict, fields: dict) -> bool:
+    """Comparar campos de duas submissões (telefone normalizado, resto exato)"""
+    for field, value in fields.items():
+        if field == "phone":
+            if normalize_phone(stored.get(field)) != normalize_phone(value):
+                return False
+        elif stored.get(field) != value:
+            return False
+    return True
+
+def find_duplicate_submission(form_type: str, token: str, key: str, fields: dict):
+    """Devolver a submissão original (token ou chave vistos na janela) se os dados forem iguais"""
+    now = time.monotonic()
+    _prune_submissions(submission_tokens, now)
+    _prune_submissions(submission_keys, now)
+    
+    for index, index_key in ((submission_tokens, token), (submission_keys, key)):
+        if not index_key:
+            continue
+        entry = index.get((form_type, index_key))
+        if entry and now - entry[0] > DUPLICATE_WINDOW_SECONDS:
+            continue
+        # Campos diferentes = outra submissão: não mostrar dados guardados nem descartar os novos
+        if entry and _same_submission_fields(entry[1], fields):
+            return entry[1]
+    return None
+
+def hit_rate_limit(request: Request, limit, scope: str) -> bool:
+    """Consumir um pedido do limite da submissão; devolve False se excedido"""
+    # Substitui @limiter.limit (que contava também os replays): respeita limiter.enabled,
+    # mas não tem o swallow_errors nem o fallback de storage do decorator - com o
+    # storage em memória por omissão, hit() não falha.
+    if not limiter.enabled:
+        return True
+    return limiter.limiter.hit(limit, get_remote_address(request), scope)
+
+def record_submission(form_type: str, token: str, key: str, registration: dict):
+    """Registar uma submissão bem sucedida nos índices de duplicados"""
+    entry = (time.monotonic(), registration)
+    # pop antes de inserir: a entrada vai para o fim e a ordem de inserção continua cronológica
+    if token:
+        submission_tokens.pop((form_type, token), None)
+        submission_tokens[(form_type, token)] = entry
+    if key:
+        submission_keys.pop((form_type, key), None)
+        submission_keys[(form_type, key)] = entry
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -93,51 +193,69 @@ os.makedirs("templates", exist_ok=True)
 # IDs das pastas do Google Drive para a galeria
 FOLDER_ID = '1769MEGbRjrUFu_HbplMDY0fh-9meEVuA'
 
+def list_drive_files(folder_id=None):
+    """Lista arquivos de uma pasta do Google Drive (lança exceção em caso de erro)"""
+    if 'drive_service' not in globals() or not drive_service:
+        raise RuntimeError("Google Drive não disponível")
+    
+    folder_id = folder_id or FOLDER_ID
+    query = f"'{folder_id}' in parents and (mimeType contains 'image/' or mimeType contains 'video/')"
+    
+    # Seguir nextPageToken: sem isto a listagem fica cortada na primeira página
+    items = []
+    page_token = None
+    while True:
+        results = drive_service.files().list(
+            q=query,
+            pageSize=1000,
+            pageToken=page_token,
+            fields="nextPageToken, files(id, name, mimeType, webViewLink, webContentLink, md5Checksum, modifiedTime)"
+        ).execute()
+        
+        items.extend(results.get('files', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+    
+    media_files = []
+    for item in items:
+        file_id = item['id']
+        is_video = 'video' in item['mimeType']
+        
+        if is_video:
+            # Para vídeos, usar embed URL do Google Drive
+            download_url = f"https://drive.google.com/file/d/{file_id}/preview"
+            thumbnail_url = f"https://drive.google.com/thumbnail?id={file_id}&sz=w400"
+        else:
+            # Para imagens, usar nosso proxy local
+            download_url = f"/drive-image/{file_id}"
+            thumbnail_url = f"/drive-image/{file_id}"
+        
+        media_files.append({
+            'id': item['id'],
+            'name': item['name'],
+            'mimeType': item['mimeType'],
+            'webViewLink': item['webViewLink'],
+            'downloadLink': download_url,
+            'thumbnail_url': thumbnail_url,
+            'isVideo': is_video,
+            'isImage': 'image' in item['mimeType'],
+            'md5Checksum': item.get('md5Checksum'),
+            'modifiedTime': item.get('modifiedTime')
+        })
+    
+    print(f"✅ Encontrados {len(media_files)} arquivos na pasta {folder_id}")
+    if media_files:
+        example = media_files[0]
+        print(f"🔗 URL de exemplo ({example['mimeType']}): {example['downloadLink']}")
+    return media_files
+
 def get_drive_files(folder_id=None):
     """Busca arquivos de uma pasta específica do Google Drive"""
     try:
         # Tentar usar o drive_service se disponível
         if 'drive_service' in globals() and drive_service:
-            folder_id = folder_id or FOLDER_ID
-            query = f"'{folder_id}' in parents and (mimeType contains 'image/' or mimeType contains 'video/')"
-            
-            results = drive_service.files().list(
-                q=query,
-                fields="nextPageToken, files(id, name, mimeType, webViewLink, webContentLink)"
-            ).execute()
-            
-            items = results.get('files', [])
-            
-            media_files = []
-            for item in items:
-                file_id = item['id']
-                is_video = 'video' in item['mimeType']
-                
-                if is_video:
-                    # Para vídeos, usar embed URL do Google Drive
-                    download_url = f"https://drive.google.com/file/d/{file_id}/preview"
-                    thumbnail_url = f"https://drive.google.com/thumbnail?id={file_id}&sz=w400"
-                else:
-                    # Para imagens, usar nosso proxy local
-                    download_url = f"/drive-image/{file_id}"
-                    thumbnail_url = f"/drive-image/{file_id}"
-                
-                media_files.append({
-                    'id': item['id'],
-                    'name': item['name'],
-                    'mimeType': item['mimeType'],
-                    'webViewLink': item['webViewLink'],
-                    'downloadLink': download_url,
-                    'thumbnail_url': thumbnail_url,
-                    'isVideo': is_video,
-                    'isImage': 'image' in item['mimeType']
-                })
-            
-            print(f"✅ Encontrados {len(media_files)} arquivos na pasta {folder_id}")
-            if media_files:
-                example = media_files[0]
-                print(f"🔗 URL de exemplo ({example['mimeType']}): {example['downloadLink']}")
-            return media_files
+            return list_drive_files(folder_id)
         else:
             print("⚠️  Google Drive não disponível - usando galeria local")
             return []
@@ -195,10 +313,12 @@ except Exception as e:
 
 @app.get("/preregister", response_class=HTMLResponse)
 async def preregister_page(request: Request):
-    return templates.TemplateResponse("preregister.html", {"request": request})
+    return templates.TemplateResponse("preregister.html", {
+        "request": request,
+        "submission_token": new_submission_token()
+    })
 
 @app.post("/preregister")
-@limiter.limit("5/minute")
 async def preregister(
     request: Request,
     name: str = Form(...),
@@ -208,7 +328,8 @@ async def preregister(
     level: str = Form(...),  # Mensalidade e Nível
     inscription_type: str = Form(...),
     dance_style: str = Form(...),  # Novo campo
-    message: str = Form(None)  # Default empty if not provided
+    message: str = Form(None),  # Default empty if not provided
+    submission_token: str = Form(None)  # Idempotency token
 ):
     # Security: Sanitize all inputs
     nome = sanitize_text_input(name, 100)
@@ -219,11 +340,40 @@ async def preregister(
     registration_type = sanitize_text_input(inscription_type, 50)
     estilo_danca = sanitize_text_input(dance_style, 50)
     nota = sanitize_text_input(message, 500) if message else ""
+    token = sanitize_token(submission_token)
     
     # Validate required fields
     if not nome or not tel or not cidade:
         raise HTTPException(status_code=400, detail="Campos obrigatórios em falta")
     
+    fields = {
+        "name": nome,
+        "phone": tel,
+        "email": email_clean,
+        "city": cidade,
+        "level": nivel,
+        "inscription_type": registration_type,
+        "dance_style": estilo_danca,
+        "message": nota
+    }
+    
+    # Duplicate submission (retry/refresh): return the original success page
+    dedup_key = submission_key(tel, nome)
+    original = find_duplicate_submission("preregister", token, dedup_key, fields)
+    if original:
+        print(f"🔁 Pré-inscrição duplicada ignorada: {original['id']}")
+        return templates.TemplateResponse("preregister_success.html", {
+            "request": request,
+            "registration": original
+        })
+    
+    if not hit_rate_limit(request, PREREGISTER_RATE_LIMIT, "preregister"):
+        return templates.TemplateResponse("preregister.html", {
+            "request": request,
+            "error": "Demasiadas tentativas. Por favor, aguarde um minuto e tente novamente.",
+            "submission_token": token or new_submission_token()
+        }, status_code=429)
+    
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
     try:
@@ -235,37 +385,30 @@ async def preregister(
             print(f"📝 Google Sheets não disponível. Dados: {nome}, {tel}, {cidade}")
         
         # Redirect to success page with complete registration data
-        registration_id = f"PRE{timestamp.replace('-', '').replace(':', '').replace(' ', '')}"
+        registration = {"id": generate_submission_id("PRE"), **fields, "timestamp": timestamp}
+        record_submission("preregister", token, dedup_key, registration)
         return templates.TemplateResponse("preregister_success.html", {
             "request": request,
-            "registration": {
-                "id": registration_id,
-                "name": nome,
-                "phone": tel,
-                "email": email_clean,
-                "city": cidade,
-                "level": nivel,
-                "inscription_type": registration_type,
-                "dance_style": estilo_danca,
-                "message": nota,
-                "timestamp": timestamp
-            }
+            "registration": registration
         })
     except Exception as e:
         print(f"Erro no preregister: {e}")
         return templates.TemplateResponse("preregister.html", {
             "request": request,
-            "error": "Falha na pré-inscrição. Por favor, tente novamente."
+            "error": "Falha na pré-inscrição. Por favor, tente novamente.",
+            "submission_token": token or new_submission_token()
         })
 
 
 @app.get("/register", response_class=HTMLResponse)
 async def register_page(request: Request):
     """Página de registo completo"""
-    return templates.TemplateResponse("register.html", {"request": request})
+    return templates.TemplateResponse("register.html", {
+        "request": request,
+        "submission_token": new_submission_token()
+    })
 
 @app.post("/register")
-@limiter.limit("3/minute")
 async def register(
     request: Request,
     nome: str = Form(...),
@@ -277,7 +420,8 @@ async def register(
     nivel: str = Form(...),      # Level (Basal/Plus)
     tipo_danca: str = Form(...), # Dance style
     nota: str = Form(None),      # Optional note
-    aceito_termos: str = Form(None)  # Terms acceptance checkbox
+    aceito_termos: str = Form(None),  # Terms acceptance checkbox
+    submission_token: str = Form(None)  # Idempotency token
 ):
     """Submissão do formulário de registo completo"""
     
@@ -289,12 +433,14 @@ async def register(
     nivel_clean = sanitize_text_input(nivel, 100)
     tipo_danca_clean = sanitize_text_input(tipo_danca, 100)
     nota_clean = sanitize_text_input(nota, 500) if nota else ""
+    token = sanitize_token(submission_token)
     
     # Validate terms acceptance
     if not aceito_termos:
         return templates.TemplateResponse("register.html", {
             "request": request,
-            "error": "Deve aceitar os termos e condições para completar o registo."
+            "error": "Deve aceitar os termos e condições para completar o registo.",
+            "submission_token": token or new_submission_token()
         })
     
     # Format birth date like in Flask app
@@ -310,6 +456,34 @@ async def register(
     if not nome_clean or not telefone_clean or not cidade_clean:
         raise HTTPException(status_code=400, detail="Campos obrigatórios em falta ou inválidos")
     
+    fields = {
+        "name": nome_clean,
+        "phone": telefone_clean,
+        "city": cidade_clean,
+        "birthday": nascimento,
+        "inscription_type": inscricao_clean,
+        "level": nivel_clean,
+        "dance_style": tipo_danca_clean,
+        "message": nota_clean
+    }
+    
+    # Duplicate submission (retry/refresh): return the original success page
+    dedup_key = submission_key(telefone_clean, nome_clean)
+    original = find_duplicate_submission("register", token, dedup_key, fields)
+    if original:
+        print(f"🔁 Registo duplicado ignorado: {original['id']}")
+        return templates.TemplateResponse("register_success.html", {
+            "request": request,
+            "registration": original
+        })
+    
+    if not hit_rate_limit(request, REGISTER_RATE_LIMIT, "register"):
+        return templates.TemplateResponse("register.html", {
+            "request": request,
+            "error": "Demasiadas tentativas. Por favor, aguarde um minuto e tente novamente.",
+            "submission_token": token or new_submission_token()
+        }, status_code=429)
+    
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
     try:
@@ -331,21 +505,18 @@ async def register(
             print(f"📝 Google Sheets não disponível. Registo: {nome_clean}, {telefone_clean}, {cidade_clean}")
         
         # Redirect to success page
+        registration = {"id": generate_submission_id("REG"), **fields, "timestamp": timestamp}
+        record_submission("register", token, dedup_key, registration)
         return templates.TemplateResponse("register_success.html", {
             "request": request,
-            "registration": {"name": nome_clean, "timestamp": timestamp}
-        })
-    except Exception as e:
-        print(f"Erro no registo: {e}")
-        return templates.TemplateResponse("register.html", {
-            "request": request,
-            "error": "Falha no registo. Por favor, tente novamente."
+            "registration": registration
         })
     except Exception as e:
         print(f"Erro no registo: {e}")
         return templates.TemplateResponse("register.html", {
             "request": request,
-            "error": "Falha no registo. Por favor, tente novamente."
+            "error": "Falha no registo. Por favor, tente novamente.",
+            "submission_token": token or new_submission_token()
         })
 
 
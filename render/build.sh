@@ -7,4 +7,10 @@ echo "🚀 Starting build process for FozCaribe..."
 echo "📦 Installing Python dependencies..."
 pip install -r requirements.txt
 
+# Optional: static snapshot of the public pages (see build_static.py)
+if [ "$STATIC_BUILD" = "1" ]; then
+    echo "🗂  Building static snapshot..."
+    python "$(dirname "$0")/build_static.py"
+fi
+
 echo "✅ Build completed successfully!"
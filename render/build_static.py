@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+FozCaribe v2.0 - Static Snapshot Build Script
+Script para gerar uma versão estática do site (páginas públicas + galeria)
+
+As páginas `/`, `/gallery` e os formulários são renderizados a partir dos
+templates Jinja2 existentes. As imagens da galeria são descarregadas do
+Google Drive, redimensionadas e gravadas com nomes "fingerprinted", para que
+possam ser servidas com cache longo por qualquer servidor estático ou CDN.
+Apenas os endpoints POST (/preregister, /register, /login) precisam do FastAPI.
+
+Uso (a partir da raiz do projeto ou da pasta render/):
+    python render/build_static.py                  # build único
+    python render/build_static.py --watch 300      # reconstrói a cada 300s (só descarrega o que mudou)
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# main.py usa caminhos relativos (templates/, static/, credentials.json)
+os.chdir(PROJECT_ROOT)
+sys.path.insert(0, PROJECT_ROOT)
+
+import main  # noqa: E402
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+DEFAULT_OUTPUT_DIR = 'public'
+MEDIA_DIR = os.path.join('static', 'media')
+MANIFEST_FILE = 'manifest.json'
+MAX_IMAGE_WIDTH = 1600
+JPEG_QUALITY = 85
+
+# Rota -> template (as rotas são gravadas como <rota>/index.html)
+PAGES = {
+    '/': 'index.html',
+    '/gallery': 'gallery.html',
+    '/preregister': 'preregister.html',
+    '/register': 'register.html',
+    '/login': 'login.html',
+}
+
+
+def write_if_changed(path, content):
+    """Gravar ficheiro apenas se o conteúdo mudou (evita invalidar a cache do CDN)"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            if f.read() == content:
+                return False
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return True
+
+
+def load_manifest(output_dir):
+    """Carregar o manifesto da última build (file_id -> ficheiro gerado)"""
+    path = os.path.join(output_dir, MEDIA_DIR, MANIFEST_FILE)
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    """Gravar o manifesto da build atual"""
+    path = os.path.join(output_dir, MEDIA_DIR, MANIFEST_FILE)
+    write_if_changed(path, json.dumps(manifest, indent=2, sort_keys=True))
+
+
+def resize_image(content):
+    """Redimensionar imagem para a largura máxima da galeria (JPEG)"""
+    if Image is None:
+        return content, None
+
+    image = Image.open(io.BytesIO(content))
+    # Aplicar a orientação EXIF (fotos de telemóvel), que se perde ao regravar
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        # JPEG não tem transparência: compor sobre fundo branco em vez de preto
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    if image.width > MAX_IMAGE_WIDTH:
+        height = round(image.height * MAX_IMAGE_WIDTH / image.width)
+        image = image.resize((MAX_IMAGE_WIDTH, height), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue(), '.jpg'
+
+
+def mirror_image(media, output_dir):
+    """Descarregar, redimensionar e gravar uma imagem com nome fingerprinted"""
+    content = main.drive_service.files().get_media(fileId=media['id']).execute()
+    content, extension = resize_image(content)
+    if extension is None:
+        extension = os.path.splitext(media['name'])[1].lower() or '.img'
+
+    fingerprint = hashlib.sha256(content).hexdigest()[:12]
+    filename = f"{media['id']}.{fingerprint}{extension}"
+    write_if_changed(os.path.join(output_dir, MEDIA_DIR, filename), content)
+    return filename
+
+
+def sync_media(media_files, output_dir, manifest):
+    """Sincronizar imagens da galeria, descarregando apenas as que mudaram"""
+    media_manifest = {}
+    downloaded = 0
+
+    for media in media_files:
+        if not media['isImage']:
+            continue
+
+        version = media.get('md5Checksum') or media.get('modifiedTime')
+        previous = manifest.get('media', {}).get(media['id'])
+        if (previous and version and previous['version'] == version
+                and os.path.exists(os.path.join(output_dir, MEDIA_DIR, previous['file']))):
+            media_manifest[media['id']] = previous
+            continue
+
+        try:
+            filename = mirror_image(media, output_dir)
+            media_manifest[media['id']] = {'version': version, 'file': filename}
+            downloaded += 1
+            print(f"📥 {media['name']} -> {filename}")
+        except Exception as e:
+            print(f"❌ Erro ao descarregar {media['name']}: {e}")
+            # Manter a versão anterior (se existir) em vez de a remover
+            if previous:
+                media_manifest[media['id']] = previous
+
+    # Remover ficheiros de imagens que já não estão no Drive ou foram substituídas
+    keep = {entry['file'] for entry in media_manifest.values()} | {MANIFEST_FILE}
+    media_path = os.path.join(output_dir, MEDIA_DIR)
+    removed = 0
+    for filename in os.listdir(media_path):
+        if filename not in keep:
+            os.remove(os.path.join(media_path, filename))
+            removed += 1
+
+    print(f"✅ Media: {downloaded} descarregadas, {len(media_manifest) - downloaded} em cache, {removed} removidas")
+    return media_manifest
+
+
+def gallery_images(media_files, media_manifest):
+    """Converter ficheiros do Drive para o formato do template gallery.html"""
+    images = []
+    for media in media_files:
+        url = media['downloadLink']
+        if media['isImage']:
+            entry = media_manifest.get(media['id'])
+            if not entry:
+                continue
+            url = f"/{MEDIA_DIR}/{entry['file']}".replace(os.sep, '/')
+
+        images.append({
+            "filename": media['name'],
+            "url": url,
+            "id": media['id'],
+            "mimeType": media['mimeType'],
+            "isVideo": media['isVideo'],
+            "isImage": media['isImage']
+        })
+    return images
+
+
+def render_pages(output_dir, images):
+    """Renderizar as páginas públicas a partir dos templates Jinja2"""
+    written = 0
+    for route, template_name in PAGES.items():
+        context = {"request": None}
+        if route == '/gallery':
+            context["images"] = images
+
+        html = main.templates.get_template(template_name).render(context)
+        path = os.path.join(output_dir, route.strip('/'), 'index.html')
+        if write_if_changed(path, html):
+            written += 1
+
+    for template_name in ('404.html', '500.html'):
+        html = main.templates.get_template(template_name).render({"request": None})
+        if write_if_changed(os.path.join(output_dir, template_name), html):
+            written += 1
+
+    print(f"✅ Páginas: {written} atualizadas")
+
+
+def copy_static(output_dir):
+    """Copiar static/ (css, js, images) para o diretório de saída"""
+    shutil.copytree('static', os.path.join(output_dir, 'static'), dirs_exist_ok=True)
+
+
+def build(output_dir, force=False):
+    """Gerar (ou atualizar) o snapshot estático
+
+    Páginas e static/ são sempre regeneradas (só são gravadas se mudarem);
+    apenas as imagens inalteradas no Drive deixam de ser descarregadas.
+    """
+    manifest = {} if force else load_manifest(output_dir)
+
+    # Erros na listagem propagam-se: o snapshot anterior fica intacto
+    media_files = main.list_drive_files()
+    if not media_files and manifest.get('media') and not force:
+        raise RuntimeError("Listagem do Drive vazia - snapshot anterior mantido (use --force para limpar)")
+
+    os.makedirs(os.path.join(output_dir, MEDIA_DIR), exist_ok=True)
+    copy_static(output_dir)
+
+    media_manifest = sync_media(media_files, output_dir, manifest)
+    render_pages(output_dir, gallery_images(media_files, media_manifest))
+
+    save_manifest(output_dir, {'media': media_manifest})
+
+
+def main_cli():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description="Gerar snapshot estático do FozCaribe")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_DIR,
+                        help=f"Diretório de saída (default: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument('--force', action='store_true',
+                        help="Ignorar o manifesto e reconstruir tudo")
+    parser.add_argument('--watch', type=int, metavar='SEGUNDOS',
+                        help="Reconstruir periodicamente (só descarrega imagens alteradas no Drive)")
+    args = parser.parse_args()
+
+    print("🚀 FozCaribe v2.0 - Build estático")
+    print("=" * 55)
+
+    if Image is None:
+        print("⚠️  Pillow não instalado - imagens serão copiadas sem redimensionar")
+
+    force = args.force
+    while True:
+        try:
+            build(args.output, force=force)
+            force = False  # --force só se aplica à primeira build bem sucedida
+            print(f"\n🎉 Site estático disponível em: {os.path.join(PROJECT_ROOT, args.output)}")
+        except Exception as e:
+            print(f"❌ Erro no build: {e}")
+            if not args.watch:
+                sys.exit(1)
+
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main_cli()
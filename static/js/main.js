@@ -10,6 +10,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // Form enhancements
     initFormEnhancements();
     
+    // Idempotency tokens for form submissions
+    initSubmissionTokens();
+    
     // Intersection Observer for animations
     initScrollAnimations();
     
@@ -95,6 +98,23 @@ function initFormEnhancements() {
     });
 }
 
+// Fill empty submission tokens (static snapshot pages are rendered without one)
+function initSubmissionTokens() {
+    const tokenInputs = document.querySelectorAll('input[name="submission_token"]');
+    tokenInputs.forEach(input => {
+        if (!input.value) {
+            input.value = generateSubmissionToken();
+        }
+    });
+}
+
+function generateSubmissionToken() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+}
+
 // Simple form validation
 function validateForm(form) {
     let isValid = true;